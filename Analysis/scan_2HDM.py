@@ -87,6 +87,10 @@ if __name__ == '__main__':
         '-r', '--resolution', type=float, default=0.2,
         help='Relative resolution in mtt'
     )
+    arg_parser.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help='Number of processes to perform the scan'
+    )
     arg_parser.add_argument(
         '--save', default=None,
         help='Name of .npz file to store numeric results of the scan'
@@ -142,8 +146,7 @@ if __name__ == '__main__':
         grid = statscan.Grid(mA_values, tanbeta_values)
         calc = statscan.StatCalc(None, args.bkg, args.lumi * 1e3)
         
-        for i, mA, tanbeta in grid:
-            
+        def evaluate(mA, tanbeta):
             parton_xsec = XSecTwoHDMBenchmark(mA, tanbeta, args.params)
             reco_mtt = RecoMtt(parton_xsec, resolution=args.resolution)
             calc.update_signal(reco_mtt)
@@ -153,7 +156,10 @@ if __name__ == '__main__':
             
             print('\033[1;34mResults for mA = {:g}, tan(beta) = {:g}:'.format(mA, tanbeta))
             print('  Significance: {}\n  CLs: {}\033[0m'.format(significance, cls))
-            grid.set(i, significance, cls)
+            
+            return significance, cls
+        
+        grid.scan(evaluate, num_processes=args.jobs)
         
         
         # Save results of the scan if requested
@@ -76,25 +76,35 @@ class XSecMSSM(PartonXSec):
         
         Arguments:
             cp:  CP state of the Higgs boson, 'A' or 'H'.
-            s:  Mandelstam s variable, in GeV^2.
+            s:  Mandelstam s variable, in GeV^2.  Can also be a NumPy
+                array of such values.
             m:  Mass of the scalar running in the loop, in GeV.
         
         Return value:
-            Computed amplitude.  It is a complex number.
+            Computed amplitude.  It is a complex number or, if s is an
+            array, an array of complex numbers.
         """
         
         if cp != 'H':
             raise NotImplementedError
         
-        tau = s / (2 * m) ** 2
+        tau = np.asarray(s, dtype=np.float64) / (2 * m) ** 2
+        above = tau > 1
         
-        if tau > 1:
-            beta = math.sqrt(1 - 1 / tau)
-            f = -0.25 * (math.log((1 + beta) / (1 - beta)) - math.pi * 1j) ** 2
-        else:
-            f = math.asin(math.sqrt(tau)) ** 2
+        # Same function f as in the fermionic loop amplitude
+        beta = np.sqrt(1 - 1 / np.where(above, tau, 1.))
+        f = np.where(
+            above,
+            -0.25 * (2 * np.arctanh(beta) - math.pi * 1j) ** 2,
+            np.arcsin(np.sqrt(np.where(above, 1., tau))) ** 2
+        )
+        
+        A = -(tau - f) / tau ** 2
         
-        return -(tau - f) / tau ** 2
+        if np.ndim(s) == 0:
+            return complex(A)
+        else:
+            return A
     
     
     def xsec_res(self, sqrt_s, alpha_s):
@@ -102,18 +112,17 @@ class XSecMSSM(PartonXSec):
         
         s = sqrt_s ** 2
         
-        if s <= 4 * self.mt ** 2:
-            return 0.
-        
         prefactor = 3 * (alpha_s * self.gF * self.mt) ** 2 / (8192 * math.pi ** 3)
         
         sum_scalars = 0.
-        beta = self.beta(s)
+        
+        with np.errstate(invalid='ignore'):
+            beta = self.beta(s)
         
         # Contributions from CP-odd state
         denom = (s - self.mA ** 2) ** 2 + (self.wA * self.mA) ** 2
         ampl = self.gA_top ** 2 * self.loop_ampl_fermion('A', s)
-        sum_scalars += self.kA_res * beta * abs(ampl) ** 2 / denom
+        sum_scalars += self.kA_res * beta * np.abs(ampl) ** 2 / denom
         
         # Contribution from CP-even state
         denom = (s - self.mH ** 2) ** 2 + (self.wH * self.mH) ** 2
@@ -123,9 +132,9 @@ class XSecMSSM(PartonXSec):
             ampl += self.gH_top * gH_stop * (self.mt / m_stop) ** 2 / 2 * \
                 self.loop_ampl_scalar('H', s, m_stop)
         
-        sum_scalars += self.kH_res * beta ** 3 * abs(ampl) ** 2 / denom
+        sum_scalars += self.kH_res * beta ** 3 * np.abs(ampl) ** 2 / denom
         
-        return self.to_pb(2 * prefactor * s ** 2 * sum_scalars)
+        return self._threshold_cut(s, self.to_pb(2 * prefactor * s ** 2 * sum_scalars))
     
     
     def xsec_int(self, sqrt_s, alpha_s):
@@ -133,14 +142,12 @@ class XSecMSSM(PartonXSec):
         
         s = sqrt_s ** 2
         
-        if s <= 4 * self.mt ** 2:
-            return 0.
-        
         prefactor = - alpha_s ** 2 * self.gF * self.mt ** 2 / (64 * math.sqrt(2) * math.pi)
         
         # Integral of the factor depending on z
-        beta = self.beta(s)
-        integral = 2 / beta * math.atanh(beta)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            beta = self.beta(s)
+            integral = 2 / beta * np.arctanh(beta)
         
         sum_scalars = 0.
         
@@ -159,7 +166,7 @@ class XSecMSSM(PartonXSec):
         
         sum_scalars += self.kH_int * beta ** 3 * ampl / denom
         
-        return self.to_pb(prefactor * integral * sum_scalars.real)
+        return self._threshold_cut(s, self.to_pb(prefactor * integral * sum_scalars.real))
 
 
 if __name__ == '__main__':
@@ -177,6 +184,10 @@ if __name__ == '__main__':
         '-r', '--resolution', type=float, default=0.2,
         help='Relative resolution in mtt'
     )
+    arg_parser.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help='Number of processes to perform the scan'
+    )
     arg_parser.add_argument(
         '--save', default=None,
         help='Name of .npz file to store numeric results of the scan'
@@ -229,8 +240,7 @@ if __name__ == '__main__':
         grid = statscan.Grid(mA_values, tanbeta_values)
         calc = statscan.StatCalc(None, args.bkg, args.lumi * 1e3)
         
-        for i, mA, tanbeta in grid:
-            
+        def evaluate(mA, tanbeta):
             parton_xsec = XSecMSSM(mA, tanbeta, 'params/MSSM.root')
             reco_mtt = RecoMtt(parton_xsec, resolution=args.resolution)
             calc.update_signal(reco_mtt)
@@ -240,7 +250,10 @@ if __name__ == '__main__':
             
             print('\033[1;34mResults for mA = {:g}, tan(beta) = {:g}:'.format(mA, tanbeta))
             print('  Significance: {}\n  CLs: {}\033[0m'.format(significance, cls))
-            grid.set(i, significance, cls)
+            
+            return significance, cls
+        
+        grid.scan(evaluate, num_processes=args.jobs)
         
         
         # Save results of the scan if requested
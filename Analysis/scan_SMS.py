@@ -38,6 +38,10 @@ if __name__ == '__main__':
         '-r', '--resolution', type=float, default=0.2,
         help='Relative resolution in mtt'
     )
+    arg_parser.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help='Number of processes to perform the scan'
+    )
     arg_parser.add_argument(
         '--save', default=None,
         help='Name of .npz file to store numeric results of the scan'
@@ -93,8 +97,7 @@ if __name__ == '__main__':
         grid = statscan.Grid(mass_values, g_values)
         calc = statscan.StatCalc(None, args.bkg, args.lumi * 1e3)
         
-        for i, mass, g in grid:
-            
+        def evaluate(mass, g):
             width = XSecTwoHDM.width_tt(args.cp, mass, g=g)
             parton_xsec = XSecTwoHDM(mA=mass, wA=width, gA=g, mH=mass, wH=width, gH=g)
             
@@ -111,7 +114,10 @@ if __name__ == '__main__':
             
             print('\033[1;34mResults for {}, m = {:g}, g = {:g}:'.format(args.cp, mass, g))
             print('  Significance: {}\n  CLs: {}\033[0m'.format(significance, cls))
-            grid.set(i, significance, cls)
+            
+            return significance, cls
+        
+        grid.scan(evaluate, num_processes=args.jobs)
         
         
         # Save results of the scan if requested
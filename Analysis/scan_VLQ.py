@@ -67,10 +67,6 @@ class XSecVLQ(PartonXSec):
         """Compute cross section for resonant gg -> S -> tt."""
         
         s = sqrt_s ** 2
-        
-        if s <= 4 * self.mt ** 2:
-            return 0.
-        
         width = self.width_tt(self.cp, self.mass, s, g=self.g_tt)
         
         if self.cp == 'H':
@@ -83,22 +79,22 @@ class XSecVLQ(PartonXSec):
             + self.num_vlq * self.g_vlq * self.loop_ampl_fermion(self.cp, s, mf=self.mass_vlq)
         denom = (s - self.mass ** 2) ** 2 + (width * self.mass) ** 2
         
-        xsec = 2 * a * s ** 2 * self.beta(s) ** beta_power * self.g_tt ** 2 \
-            * abs(loop_ampl) ** 2 / denom
-        return self.to_pb(xsec * self.k_res)
+        with np.errstate(invalid='ignore'):
+            xsec = 2 * a * s ** 2 * self.beta(s) ** beta_power * self.g_tt ** 2 \
+                * np.abs(loop_ampl) ** 2 / denom
+        
+        return self._threshold_cut(s, self.to_pb(xsec * self.k_res))
     
     
     def xsec_int(self, sqrt_s, alpha_s):
         """Compute cross section for interference in gg -> S -> tt."""
         
         s = sqrt_s ** 2
-        
-        if s <= 4 * self.mt ** 2:
-            return 0.
-        
-        beta = self.beta(s)
         width = self.width_tt(self.cp, self.mass, s, g=self.g_tt)
         
+        with np.errstate(invalid='ignore'):
+            beta = self.beta(s)
+        
         if self.cp == 'H':
             beta_power = 3
         else:
@@ -107,14 +103,15 @@ class XSecVLQ(PartonXSec):
         a = -alpha_s ** 2 * self.gF * self.mt ** 2 / (64 * math.pi * math.sqrt(2))
         
         # Factor dependent on z has been integrated
-        b = math.log((1 + beta) / (1 - beta)) / beta
+        with np.errstate(invalid='ignore'):
+            b = 2 * np.arctanh(beta) / beta
         
         loop_ampl = self.g_tt * self.loop_ampl_fermion(self.cp, s, mf=self.mt) \
             + self.num_vlq * self.g_vlq * self.loop_ampl_fermion(self.cp, s, mf=self.mass_vlq)
         propagator = s - self.mass ** 2 + 1j * width * self.mass
         
         xsec = a * b * beta ** beta_power * self.g_tt * (loop_ampl / propagator).real
-        return self.to_pb(xsec * self.k_int)
+        return self._threshold_cut(s, self.to_pb(xsec * self.k_int))
 
 
 if __name__ == '__main__':
@@ -136,6 +133,10 @@ if __name__ == '__main__':
         '-r', '--resolution', type=float, default=0.2,
         help='Relative resolution in mtt'
     )
+    arg_parser.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help='Number of processes to perform the scan'
+    )
     arg_parser.add_argument(
         '--save', default=None,
         help='Name of .npz file to store numeric results of the scan'
@@ -177,6 +178,13 @@ if __name__ == '__main__':
         calc = statscan.StatCalc(None, args.bkg, args.lumi * 1e3)
         
         
+        # The same object to compute reconstructed mtt is reused for all
+        # points.  This avoids reloading PDF and the s-hat convolution
+        # for each of them.  Updating the parton-level cross section
+        # invalidates the cached grid.
+        reco_mtt = RecoMtt(None, resolution=args.resolution)
+        
+        
         # Compute significance in SM+S
         sms_significance = {}
         
@@ -184,18 +192,15 @@ if __name__ == '__main__':
             
             # SM+S is reproduced in the VLQ model when VLQ coupling is
             # set to zero
-            parton_xsec = XSecVLQ(args.cp, mH, mH, g_vlq=0.)
-            reco_mtt = RecoMtt(parton_xsec, resolution=args.resolution)
+            reco_mtt.parton_xsec = XSecVLQ(args.cp, mH, mH, g_vlq=0.)
             calc.update_signal(reco_mtt)
             
             sms_significance[mH] = calc.significance()
         
         
         # Now perform the scan with VLQ
-        for i, mH, mass_vlq in grid:
-            
-            parton_xsec = XSecVLQ(args.cp, mH, mass_vlq)
-            reco_mtt = RecoMtt(parton_xsec, resolution=args.resolution)
+        def evaluate(mH, mass_vlq):
+            reco_mtt.parton_xsec = XSecVLQ(args.cp, mH, mass_vlq)
             calc.update_signal(reco_mtt)
             
             significance = calc.significance()
@@ -207,7 +212,9 @@ if __name__ == '__main__':
             
             # Instead of the significance, store the difference w.r.t.
             # SM+S.  CLs values will not be used, so put a placeholder.
-            grid.set(i, significance - sms_significance[mH], 0.)
+            return significance - sms_significance[mH], 0.
+        
+        grid.scan(evaluate, num_processes=args.jobs)
         
         
         # Save results of the scan if requested
@@ -2,6 +2,7 @@
 
 """Suppresses fluctuations in systematic variations."""
 
+import math
 import os
 
 import numpy as np
@@ -18,7 +19,8 @@ def hist_to_np(hist, full=False):
     """Convert ROOT histogram content into a NumPy array.
     
     Arguments:
-        hist:  ROOT histogram.
+        hist:  ROOT histogram with double-precision bin contents,
+            e.g. TH1D.
         full:  Indicates whether only bin contents are extracted or also
             the binning and errors.
     
@@ -28,26 +30,45 @@ def hist_to_np(hist, full=False):
     """
     
     num_bins = hist.GetNbinsX()
-    content = np.empty(num_bins)
     
-    for bin in range(1, num_bins + 1):
-        content[bin - 1] = hist.GetBinContent(bin)
+    # Bin contents, including under- and overflows, are read in one go
+    # from the underlying array of the histogram
+    content = root_buffer_to_np(hist.GetArray(), num_bins + 2)[1:-1]
     
     if not full:
         return content
     else:
-        binning = np.empty(num_bins + 1)
-        errors = np.empty(num_bins)
+        axis = hist.GetXaxis()
         
-        for bin in range(1, num_bins + 1):
-            binning[bin - 1] = hist.GetBinLowEdge(bin)
-            errors[bin - 1] = hist.GetBinError(bin)
+        if axis.GetXbins().GetSize() > 0:
+            binning = root_buffer_to_np(axis.GetXbins().GetArray(), num_bins + 1)
+        else:
+            binning = np.linspace(axis.GetXmin(), axis.GetXmax(), num=num_bins + 1)
         
-        binning[-1] = hist.GetBinLowEdge(num_bins + 1)
+        if hist.GetSumw2N() > 0:
+            errors = np.sqrt(root_buffer_to_np(hist.GetSumw2().GetArray(), num_bins + 2)[1:-1])
+        else:
+            errors = np.sqrt(np.abs(content))
         
         return binning, content, errors
 
 
+def root_buffer_to_np(buffer, size):
+    """Copy content of a ROOT buffer of doubles into a NumPy array.
+    
+    Arguments:
+        buffer:  PyROOT buffer object, such as returned by method
+            GetArray of TH1D or TArrayD.
+        size:  Number of elements in the buffer.
+    
+    Return value:
+        NumPy array with a copy of the content of the buffer.
+    """
+    
+    buffer.SetSize(size)
+    return np.frombuffer(buffer, dtype=np.float64, count=size).copy()
+
+
 class Smoother:
     """A class to smooth fluctuations in a systematic variations.
     
@@ -57,6 +78,10 @@ class Smoother:
     [1] https://en.wikipedia.org/wiki/Local_regression
     """
     
+    # Precomputed weights for LOWESS fits, indexed by bandwidth and
+    # external weights
+    _lowess_cache = {}
+    
     def __init__(self, nominal, up, down, weights):
         """Initializer from reference templates.
         
@@ -87,37 +112,12 @@ class Smoother:
             Smoothed sequence.
         """
         
-        y_smooth = np.empty_like(y)
-        
-        for i in range(len(y_smooth)):
-            
-            # Point indices, centred at the current point, will be used
-            # as x coordinate
-            x = np.arange(len(y_smooth)) - i
-            
-            # Compute standard weights for LOWESS
-            distances = np.abs(x) / bandwidth
-            weights = (1 - distances ** 3) ** 3
-            np.clip(weights, 0., None, out=weights)
-            
-            # Include weights provided by the caller and rescale weights
-            # to simplify computation of various mean values below
-            weights *= external_weights
-            weights /= np.sum(weights)
-            
-            
-            # Compute smoothed value for the current point with weighted
-            # least-squares fit with a linear function.  Since x
-            # coordinates are centred at the current point, only need to
-            # find the constant term in the linear function.
-            mean_x = np.dot(weights, x)
-            mean_y = np.dot(weights, y)
-            mean_x2 = np.dot(weights, x ** 2)
-            mean_xy = np.dot(weights, x * y)
-            
-            y_smooth[i] = (mean_x2 * mean_y - mean_x * mean_xy) / (mean_x2 - mean_x ** 2)
+        half_window, window_indices, fit_weights = Smoother._lowess_kernel(
+            external_weights, bandwidth
+        )
+        y_windows = np.pad(y, half_window, 'constant')[window_indices]
         
-        return y_smooth
+        return np.sum(fit_weights * y_windows, axis=1)
     
     
     def smooth(self, bandwidth=5):
@@ -140,8 +140,7 @@ class Smoother:
             0.5 * (self.up - self.down) / self.nominal, self.weights, bandwidth
         )
         
-        sfUp = self._scale_factor(self.up)
-        sfDown = self._scale_factor(self.down)
+        sfUp, sfDown = self._scale_factors()
         
         return (
             self.nominal * (1 + sfUp * self.smooth_averaged_deviation),
@@ -149,23 +148,120 @@ class Smoother:
         )
     
     
-    def _scale_factor(self, template):
-        """Compute scale factor for smoothed relative deviation.
+    def _scale_factors(self):
+        """Compute scale factors for smoothed relative deviation.
         
-        Find a scale factor that gives the best match (smallest chi^2)
-        between smoothed and given template.
+        For each of the up and down templates, find a scale factor that
+        gives the best match (smallest chi^2) between it and the
+        smoothed template.
         
         Arguments:
-            template:  Template to match.
+            None.
         
         Return value:
-            Scale factor to be applied to smoothed relative deviation.
+            Tuple with scale factors for up and down variations, to be
+            applied to smoothed relative deviation.
         """
         
-        # This is result of an analytical computation
-        smooth_abs_dev = self.smooth_averaged_deviation * self.nominal
-        return np.sum(smooth_abs_dev * (template - self.nominal) * self.weights) / \
-            np.sum(smooth_abs_dev ** 2 * self.weights)
+        # This is result of an analytical computation.  The weighted
+        # smoothed absolute deviation and the denominator are shared
+        # between the two variations.
+        weighted_smooth_abs_dev = self.smooth_averaged_deviation * self.nominal * self.weights
+        denom = np.dot(weighted_smooth_abs_dev, self.smooth_averaged_deviation * self.nominal)
+        
+        return (
+            np.dot(weighted_smooth_abs_dev, self.up - self.nominal) / denom,
+            np.dot(weighted_smooth_abs_dev, self.down - self.nominal) / denom
+        )
+    
+    
+    @classmethod
+    def _lowess_kernel(cls, external_weights, bandwidth):
+        """Construct weights for LOWESS fits.
+        
+        The smoothed value at each point is a linear combination of
+        input values in a window around it, with coefficients that only
+        depend on the external weights and the bandwidth.  They are
+        cached so that the same weights can be reused for different
+        input sequences, e.g. for multiple systematic variations.
+        
+        Arguments:
+            external_weights:  Weights of points in the sequence.
+            bandwidth:  Smoothing bandwidth defined in terms of indices.
+        
+        Return value:
+            Tuple with the half-size of the window, indices of points
+            in the padded input sequence included in each window, and
+            coefficients to be applied to them.  Row i of the last two
+            arrays corresponds to the window around point i.
+        """
+        
+        external_weights = np.asarray(external_weights, dtype=np.float64)
+        key = (bandwidth, external_weights.tobytes())
+        
+        if key in cls._lowess_cache:
+            return cls._lowess_cache[key]
+        
+        
+        # Standard LOWESS weights vanish for points that are separated
+        # from the centre by the bandwidth or more.  Thus only need to
+        # consider a window of 2 * half_window + 1 points around each
+        # centre.  Point indices, centred at the current point, are used
+        # as x coordinates, and they are the same for all windows.
+        half_window = math.ceil(bandwidth) - 1
+        x = np.arange(-half_window, half_window + 1)
+        
+        # Compute standard weights for LOWESS
+        distances = np.abs(x) / bandwidth
+        kernel = 1 - distances * distances * distances
+        kernel *= kernel * kernel
+        
+        # Pad the input sequence so that all windows have the same
+        # size.  Padded points get zero weights.
+        window_indices = np.arange(len(external_weights))[:, np.newaxis] + np.arange(len(x))
+        weights = np.pad(external_weights, half_window, 'constant')[window_indices]
+        
+        # Include weights provided by the caller
+        weights *= kernel
+        
+        
+        # Smoothed values are found with weighted least-squares fits
+        # with a linear function.  Since x coordinates are centred at
+        # the current point, only need to find the constant term in
+        # each linear function.  It is linear in y, and the coefficients
+        # are given by the first row of the solution operator for the
+        # weighted design matrix, multiplied by square roots of the
+        # weights.  The design matrix has only two columns, so its QR
+        # decomposition is computed explicitly for all windows at once,
+        # using the Gram-Schmidt procedure.  This avoids the normal
+        # equations, which are numerically less stable.
+        sqrt_weights = np.sqrt(weights)
+        col_const = sqrt_weights
+        col_slope = sqrt_weights * x
+        
+        r11 = np.sqrt(np.sum(col_const * col_const, axis=1))
+        q1 = np.zeros_like(col_const)
+        np.divide(col_const, r11[:, np.newaxis], out=q1, where=(r11[:, np.newaxis] > 0.))
+        
+        r12 = np.sum(q1 * col_slope, axis=1)
+        v = col_slope - r12[:, np.newaxis] * q1
+        r22 = np.sqrt(np.sum(v * v, axis=1))
+        
+        # If the window is degenerate (e.g. only one point has a
+        # non-zero weight), the slope cannot be determined.  Then drop
+        # it, which reduces the fit to a weighted mean.
+        full_rank = r22 > np.finfo(np.float64).eps * len(x) * r11
+        slope_coeffs = np.zeros_like(r22)
+        np.divide(r12, r22 * r22, out=slope_coeffs, where=full_rank)
+        
+        fit_weights = q1 - slope_coeffs[:, np.newaxis] * v
+        np.divide(fit_weights, r11[:, np.newaxis], out=fit_weights, where=(r11[:, np.newaxis] > 0.))
+        fit_weights *= sqrt_weights
+        
+        result = (half_window, window_indices, fit_weights)
+        cls._lowess_cache[key] = result
+        
+        return result
         
 
 
@@ -189,23 +285,33 @@ if __name__ == '__main__':
     binning, nominal, errors = hist_to_np(input_file.Get('TT'), full=True)
     
     
-    # Copy histograms that do not need smoothing
+    # Systematic variations to be smoothed and their labels for plots
+    smoothed_systs = [
+        ('MttScale', 'Exp. scale in $m_{t\\bar t}$'),
+        ('FSR', '$\\alpha_s$ in FSR'), ('MassT', '$m_t$')
+    ]
+    
+    
+    # Copy histograms that do not need smoothing.  Check the name
+    # stored in the key first so that histograms to be smoothed are not
+    # read needlessly.
     for key in input_file.GetListOfKeys():
         
-        hist = key.ReadObj()
-        name = hist.GetName()
+        name = key.GetName()
         
-        if 'MttScale' in name or 'FSR' in name or 'MassT' in name:
+        if any(syst_name in name for syst_name, _ in smoothed_systs):
             continue
         
+        hist = key.ReadObj()
         hist.SetDirectory(output_file)
         templates_to_save.append(hist)
     
     
-    for syst_name, label in [
-        ('MttScale', 'Exp. scale in $m_{t\\bar t}$'),
-        ('FSR', '$\\alpha_s$ in FSR'), ('MassT', '$m_t$')
-    ]:
+    # The same figure is reused for plots of all variations
+    fig = plt.figure()
+    axes = fig.add_subplot(111)
+    
+    for syst_name, label in smoothed_systs:
         # Smooth variations
         up = hist_to_np(input_file.Get('TT_{}Up'.format(syst_name)))
         down = hist_to_np(input_file.Get('TT_{}Down'.format(syst_name)))
@@ -223,8 +329,9 @@ if __name__ == '__main__':
                 len(binning) - 1, binning
             )
             
-            for bin in range(1, hist_smooth.GetNbinsX() + 1):
-                hist_smooth.SetBinContent(bin, smooth_template[bin - 1])
+            # Set all bin contents at once.  The array must include
+            # under- and overflow bins.
+            hist_smooth.SetContent(np.concatenate(([0.], smooth_template, [0.])))
             
             hist_smooth.SetDirectory(output_file)
             templates_to_save.append(hist_smooth)
@@ -236,25 +343,18 @@ if __name__ == '__main__':
         up_smooth = up_smooth / nominal - 1
         down_smooth = down_smooth / nominal - 1
         
-        fig = plt.figure()
-        axes = fig.add_subplot(111)
+        axes.clear()
         
-        axes.hist(
-            binning[:-1], bins=binning, weights=up * 100, histtype='step',
-            color='#a8d2f0', label='Up, input'
-        )
-        axes.hist(
-            binning[:-1], bins=binning, weights=up_smooth * 100, histtype='step',
-            color='#1f77b4', label='Up, smoothed'
-        )
-        axes.hist(
-            binning[:-1], bins=binning, weights=down * 100, histtype='step',
-            color='#ffc999', label='Down, input'
-        )
-        axes.hist(
-            binning[:-1], bins=binning, weights=down_smooth * 100, histtype='step',
-            color='#ff7f0e', label='Down, smoothed'
-        )
+        # Draw the deviations as step functions.  The last value is
+        # repeated so that the last bin is drawn fully.
+        for deviation, colour, plot_label in [
+            (up, '#a8d2f0', 'Up, input'), (up_smooth, '#1f77b4', 'Up, smoothed'),
+            (down, '#ffc999', 'Down, input'), (down_smooth, '#ff7f0e', 'Down, smoothed')
+        ]:
+            axes.step(
+                binning, np.append(deviation, deviation[-1]) * 100, where='post',
+                color=colour, label=plot_label
+            )
         
         axes.axhline(0., color='black', lw=0.8, ls='dashed')
         
@@ -271,7 +371,8 @@ if __name__ == '__main__':
         )
         
         fig.savefig(os.path.join(fig_dir, syst_name + '.pdf'))
-        plt.close(fig)
+    
+    plt.close(fig)
     
     
     output_file.Write()
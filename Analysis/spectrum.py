@@ -9,9 +9,6 @@ import math
 
 import numpy as np
 
-from scipy.integrate import simps
-from scipy.interpolate import interp1d
-
 import lhapdf
 
 
@@ -30,7 +27,8 @@ class PartonXSec(abc.ABC):
     constant.
     
     Several auxiliary methods, such as computation of the partial width
-    for the H -> tt decay, are also provided.
+    for the H -> tt decay, are also provided.  Where noted, they accept
+    NumPy arrays as well as scalars.
     
     Class attributes:
         mt:  Mass of the top quark (GeV).
@@ -38,7 +36,8 @@ class PartonXSec(abc.ABC):
     
     A subclass must override methods to compute the two cross sections
     and set the typical scale at which the cross section can change
-    substantially.
+    substantially.  The cross sections must support evaluation on NumPy
+    arrays of sqrt(s) and alpha_s.
     """
     
     mt = 173.  # GeV
@@ -54,13 +53,14 @@ class PartonXSec(abc.ABC):
         """Compute velocity of each of the top quarks.
         
         Arguments:
-            s:  Mandelstam s variable, in GeV^2.
+            s:  Mandelstam s variable, in GeV^2.  Can also be a NumPy
+                array of such values.
         
         Return value:
-            The velocity beta.
+            The velocity beta.  It is an array if s is an array.
         """
         
-        return math.sqrt(1 - 4 * PartonXSec.mt ** 2 / s)
+        return np.sqrt(1 - 4 * PartonXSec.mt ** 2 / s)
     
     
     @staticmethod
@@ -73,12 +73,14 @@ class PartonXSec(abc.ABC):
         
         Arguments:
             cp:  CP state of the Higgs boson, 'A' or 'H'.
-            s:  Mandelstam s variable, in GeV^2.
+            s:  Mandelstam s variable, in GeV^2.  Can also be a NumPy
+                array of such values.
             mf:  Mass of the fermion, in GeV.  Alternatively, can be
                 None.  In this case mass of the top quark is used.
         
         Return value:
-            Computed amplitude.  It is a complex number.
+            Computed amplitude.  It is a complex number or, if s is an
+            array, an array of complex numbers.
         """
         
         PartonXSec._check_cp(cp)
@@ -86,20 +88,29 @@ class PartonXSec(abc.ABC):
         if mf is None:
             mf = PartonXSec.mt
         
-        tau = s / (2 * mf) ** 2
+        tau = np.asarray(s, dtype=np.float64) / (2 * mf) ** 2
+        above = tau > 1
         
-        if tau > 1:
-            beta = math.sqrt(1 - 1 / tau)
-            f = -0.25 * (math.log((1 + beta) / (1 - beta)) - math.pi * 1j) ** 2
-        else:
-            f = math.asin(math.sqrt(tau)) ** 2
+        # Evaluate the function f on both sides of the threshold and
+        # then choose the right branch.  Arguments from the other side
+        # of the threshold are replaced with 1 to keep the computation
+        # valid.
+        beta = np.sqrt(1 - 1 / np.where(above, tau, 1.))
+        f = np.where(
+            above,
+            -0.25 * (2 * np.arctanh(beta) - math.pi * 1j) ** 2,
+            np.arcsin(np.sqrt(np.where(above, 1., tau))) ** 2
+        )
         
         if cp == 'H':
             A = 2 * (tau + (tau - 1) * f) / tau ** 2
         else:
             A = 2 * f / tau
         
-        return A
+        if np.ndim(s) == 0:
+            return complex(A)
+        else:
+            return A
     
     
     @staticmethod
@@ -144,13 +155,14 @@ class PartonXSec(abc.ABC):
         Arguments:
             cp:  CP state of the Higgs boson, 'A' or 'H'.
             mass:  Mass of the Higgs boson, in GeV.
-            s:  Mandelstam s variable, in GeV^2.  Alternatively, can be
-                None.  In this case compute the width at the scale
-                mass^2.
+            s:  Mandelstam s variable, in GeV^2, or a NumPy array of
+                such values.  Alternatively, can be None.  In this case
+                compute the width at the scale mass^2.
             g:  Reduced coupling to top quarks.
         
         Return value:
-            Partial width for the decay H -> tt, in GeV.
+            Partial width for the decay H -> tt, in GeV.  It is an array
+            if s is an array.
         """
         
         PartonXSec._check_cp(cp)
@@ -163,22 +175,30 @@ class PartonXSec(abc.ABC):
         if s is None:
             s = mass ** 2
         
-        if s < 4 * PartonXSec.mt ** 2:
-            return 0.
+        with np.errstate(invalid='ignore'):
+            width = g ** 2 * 3 * PartonXSec.gF * PartonXSec.mt ** 2 / (4 * math.pi * math.sqrt(2)) \
+                * PartonXSec.beta(s) ** beta_power * s / mass
+        
+        width = np.where(s < 4 * PartonXSec.mt ** 2, 0., width)
         
-        return g ** 2 * 3 * PartonXSec.gF * PartonXSec.mt ** 2 / (4 * math.pi * math.sqrt(2)) \
-            * PartonXSec.beta(s) ** beta_power * s / mass
+        if np.ndim(width) == 0:
+            return float(width)
+        else:
+            return width
     
     
     def xsec(self, sqrt_s, alpha_s):
         """Compute cross section for gg -> S -> tt.
         
         Arguments:
-            sqrt_s:  Square root of Mandelstam s variable, in GeV.
-            alpha_s:  Value of the strong coupling constant.
+            sqrt_s:  Square root of Mandelstam s variable, in GeV, or a
+                NumPy array of such values.
+            alpha_s:  Value of the strong coupling constant, or an array
+                of such values of the same shape as sqrt_s.
         
         Return value:
-            Computed cross section, in pb.
+            Computed cross section, in pb.  It is an array if sqrt_s is
+            an array.
         """
         
         return self.xsec_res(sqrt_s, alpha_s) + self.xsec_int(sqrt_s, alpha_s)
@@ -189,11 +209,14 @@ class PartonXSec(abc.ABC):
         """Compute cross section for resonant part in gg -> S -> tt.
         
         Arguments:
-            sqrt_s:  Square root of Mandelstam s variable, in GeV.
-            alpha_s:  Value of the strong coupling constant.
+            sqrt_s:  Square root of Mandelstam s variable, in GeV, or a
+                NumPy array of such values.
+            alpha_s:  Value of the strong coupling constant, or an array
+                of such values of the same shape as sqrt_s.
         
         Return value:
-            Computed cross section, in pb.
+            Computed cross section, in pb.  It is an array if sqrt_s is
+            an array.
         
         Method must be implemented in a subclass.
         """
@@ -206,11 +229,14 @@ class PartonXSec(abc.ABC):
         """Compute cross section for interference in gg -> S -> tt.
         
         Arguments:
-            sqrt_s:  Square root of Mandelstam s variable, in GeV.
-            alpha_s:  Value of the strong coupling constant.
+            sqrt_s:  Square root of Mandelstam s variable, in GeV, or a
+                NumPy array of such values.
+            alpha_s:  Value of the strong coupling constant, or an array
+                of such values of the same shape as sqrt_s.
         
         Return value:
-            Computed cross section, in pb.
+            Computed cross section, in pb.  It is an array if sqrt_s is
+            an array.
         
         Method must be implemented in a subclass.
         """
@@ -218,6 +244,32 @@ class PartonXSec(abc.ABC):
         raise NotImplementedError
     
     
+    @staticmethod
+    def _threshold_cut(s, xsec):
+        """Set cross section to zero below the tt threshold.
+        
+        Allows to compute the cross section with the same expressions
+        for all values of s, including those for which the expressions
+        are not defined, and then discard the latter.
+        
+        Arguments:
+            s:  Mandelstam s variable, in GeV^2, or a NumPy array of
+                such values.
+            xsec:  Cross section computed for given s.
+        
+        Return value:
+            Cross section with values below the threshold replaced by
+            zeros.  It is a float if s is a scalar.
+        """
+        
+        xsec = np.where(s > 4 * PartonXSec.mt ** 2, xsec, 0.)
+        
+        if np.ndim(xsec) == 0:
+            return float(xsec)
+        else:
+            return xsec
+    
+    
     @staticmethod
     def _check_cp(cp):
         """Check if given CP state is supported.
@@ -244,6 +296,20 @@ class RecoMtt:
     experimental resolution.
     """
     
+    # Fitted parameters of log-cubic approximations for selection
+    # efficiency, starting from the highest power
+    _sel_eff_coeffs = {
+        'Res': (-0.1166857, 2.19917117, -13.58990087, 27.78332692),
+        'Int': (-0.05877867, 1.03660773, -5.91517033, 11.11336388)
+    }
+    
+    # Auxiliary uniform grid used in the convolution when the
+    # precomputed grid is too coarse.  Points are given as offsets from
+    # the centre of the window in units of its half-width.  Also store
+    # weights of Simpson's rule for this grid, up to the step size.
+    _aux_offsets = np.linspace(-1., 1., num=101)
+    _aux_simpson_weights = np.array([1.] + [4., 2.] * 49 + [4., 1.]) / 3
+    
     def __init__(
         self, parton_xsec, resolution=0.2, shat_pdf_file='sHatPDF.npy',
         pdflabel='PDF4LHC15_nlo_30_pdfas'
@@ -255,7 +321,8 @@ class RecoMtt:
                 A subclass of PartonXSec is expected.
             resolution:  Relative resolution in mtt.
             shat_pdf_file:  NumPy file with array that provides PDF
-                convolution as a function of parton-level s.
+                convolution as a function of parton-level s.  Will be
+                interpolated linearly.
             pdflabel:  PDF set from which strong coupling constant will
                 be read.
         """
@@ -264,8 +331,7 @@ class RecoMtt:
         self.resolution = resolution
         self.pdf = lhapdf.mkPDF(pdflabel, 0)
         
-        shat_pdf = np.load(shat_pdf_file)
-        self.shat_pdf_interp = interp1d(shat_pdf[0], shat_pdf[1], copy=False, assume_sorted=True)
+        self.shat_pdf = np.load(shat_pdf_file)
         
         # Branching ratio for targeted decays.  Set to l+jets, l = e/mu.
         self.target_branching = 8 / 27
@@ -282,9 +348,6 @@ class RecoMtt:
         # set to a NumPy array of shape (2, N) that contains values of
         # mtt and corresponding cross section.
         self.xsec_nosmear_grid = None
-        
-        # An interpolation function for self.xsec_nosmear_grid
-        self.xsec_nosmear_interp = None
     
     
     def build_xsec_grid(self, rel_tolerance=0.005):
@@ -316,44 +379,63 @@ class RecoMtt:
         
         # Initial uniform grid
         num_points = max(100, round((mtt_range[1] - mtt_range[0]) / self.parton_xsec.var_scale))
-        mtt_values = list(np.linspace(mtt_range[0], mtt_range[1], num=num_points))
-        xsec_values = [0.] * len(mtt_values)
+        mtt_initial = np.linspace(mtt_range[0], mtt_range[1], num=num_points)
+        xsec_initial = self.xsec_no_smear(mtt_initial)
         
-        for i in range(len(mtt_values)):
-            xsec_values[i] = self.xsec_no_smear(mtt_values[i])
+        tolerance = rel_tolerance * (np.max(xsec_initial) - np.min(xsec_initial))
         
         
-        tolerance = rel_tolerance * (max(xsec_values) - min(xsec_values))
+        # Segments that still need to be checked, described by their
+        # end points
+        mtt_left, mtt_right = mtt_initial[:-1], mtt_initial[1:]
+        xsec_left, xsec_right = xsec_initial[:-1], xsec_initial[1:]
         
+        # Accepted segments are represented by their right ends.  The
+        # first point of the initial grid is added separately.
+        accepted_mtt = [mtt_initial[:1]]
+        accepted_xsec = [xsec_initial[:1]]
         
-        # Iteratively adjust the grid adding more points where needed
-        i = 0
-        
-        while i < len(mtt_values) - 1:
+        # Iteratively adjust the grid adding more points where needed.
+        # All segments at the same level of refinement are processed
+        # together, with a single evaluation of the cross section.
+        while len(mtt_left) > 0:
             
             # Check how well the function is approximated with a linear
             # extrapolation.  To do it, compute the vertical distance
             # between the interpolated and the actual value of the
-            # function at the centre of the segment.
-            mean_mtt = (mtt_values[i] + mtt_values[i + 1]) / 2
+            # function at the centre of each segment.
+            mean_mtt = (mtt_left + mtt_right) / 2
             xsec_mean_mtt = self.xsec_no_smear(mean_mtt)
-            deviation = abs(xsec_mean_mtt - (xsec_values[i] + xsec_values[i + 1]) / 2)
+            deviation = np.abs(xsec_mean_mtt - (xsec_left + xsec_right) / 2)
+            
+            # If the overall change of the function over a segment is
+            # larger than the tolerance or the function deviates to much
+            # from a linear interpolation, split the segment at the
+            # middle point.  The condition imposed on the deviation of
+            # the middle point also means that the largest change in
+            # the function on all three points is less than the
+            # tolerance.
+            split = np.logical_or(
+                np.abs(xsec_right - xsec_left) > tolerance, deviation > tolerance / 2
+            )
+            accept = np.logical_not(split)
+            accepted_mtt.append(mtt_right[accept])
+            accepted_xsec.append(xsec_right[accept])
             
-            # If the overall change of the function over the current
-            # segment is larger than the tolerance or the function
-            # deviates to much from a linear interpolation, add the
-            # middle point to the grid.  The condition imposed on the
-            # deviation of the middle point also means that the largest
-            # change in the function on all three points is less than
-            # the tolerance.
-            if abs(xsec_values[i + 1] - xsec_values[i]) > tolerance or deviation > tolerance / 2:
-                mtt_values.insert(i + 1, mean_mtt)
-                xsec_values.insert(i + 1, xsec_mean_mtt)
-            else:
-                i += 1
-        
-        self.xsec_nosmear_grid = np.array([mtt_values, xsec_values])
-        self.xsec_nosmear_interp = None
+            mtt_left, mtt_right = (
+                np.concatenate((mtt_left[split], mean_mtt[split])),
+                np.concatenate((mean_mtt[split], mtt_right[split]))
+            )
+            xsec_left, xsec_right = (
+                np.concatenate((xsec_left[split], xsec_mean_mtt[split])),
+                np.concatenate((xsec_mean_mtt[split], xsec_right[split]))
+            )
+        
+        mtt_values = np.concatenate(accepted_mtt)
+        xsec_values = np.concatenate(accepted_xsec)
+        order = np.argsort(mtt_values)
+        
+        self.xsec_nosmear_grid = np.vstack([mtt_values[order], xsec_values[order]])
     
     
     @property
@@ -402,26 +484,28 @@ class RecoMtt:
         """Compute efficiency of event selection.
         
         Arguments:
-            mtt:  Parton-level mtt, in GeV.
+            mtt:  Parton-level mtt, in GeV.  Can also be a NumPy array
+                of such values.
             subprocess:  String 'Res' or 'Int' to choose resonant part
                 or interference.
         
         Return value:
-            Efficiency.
+            Efficiency.  It is an array if mtt is an array.
         
         Computed efficiency includes accounts for the branching ratio of
         targeted decays, lepton identification, and b-tagging.
         """
         
-        # Fitted parameters of a log-cubic approximation
-        if subprocess == 'Res':
-            coeffs = [-0.1166857, 2.19917117, -13.58990087, 27.78332692]
-        elif subprocess == 'Int':
-            coeffs = [-0.05877867, 1.03660773, -5.91517033, 11.11336388]
-        else:
+        try:
+            c3, c2, c1, c0 = self._sel_eff_coeffs[subprocess]
+        except KeyError:
             raise RuntimeError('Do not recognize subprocess "{}".'.format(subprocess))
         
-        return np.polyval(coeffs, math.log(mtt)) * self.target_branching * self.add_sel_eff
+        # Evaluate the polynomial with Horner's scheme
+        log_mtt = np.log(mtt)
+        eff = ((c3 * log_mtt + c2) * log_mtt + c1) * log_mtt + c0
+        
+        return eff * self.target_branching * self.add_sel_eff
     
     
     def xsec(self, mtt, num_sigma=3):
@@ -437,98 +521,167 @@ class RecoMtt:
         build_xsec_grid.
         
         Arguments:
-            mtt:  Value of smeared mtt, in GeV.
+            mtt:  Value of smeared mtt, in GeV, or a 1D array_like of
+                such values.
             num_sigma:  Defines truncation for Gaussian kernel.
         
         Return value:
-            Full differential cross section in mtt, in pb / GeV.
+            Full differential cross section in mtt, in pb / GeV.  If an
+            array of mtt values has been given, this is an array of the
+            same length.
         """
         
         # Precompute cross section without smearing if not done yet
         if self.xsec_nosmear_grid is None:
             self.build_xsec_grid()
         
+        mtt_values = np.atleast_1d(np.asarray(mtt, dtype=np.float64))
+        xsec = np.empty_like(mtt_values)
+        
         
-        # Find the integration window
-        half_width = num_sigma * self.resolution * mtt
-        start = np.searchsorted(self.xsec_nosmear_grid[0], mtt - half_width, 'left')
-        end = np.searchsorted(self.xsec_nosmear_grid[0], mtt + half_width, 'right')
+        # Find the integration windows
+        half_width = num_sigma * self.resolution * mtt_values
+        start = np.searchsorted(self.xsec_nosmear_grid[0], mtt_values - half_width, 'left')
+        end = np.searchsorted(self.xsec_nosmear_grid[0], mtt_values + half_width, 'right')
+        
+        # Normalization factor for the Gaussian kernel, which includes a
+        # correction for truncation in it.  The latter is not exact
+        # because the variance of the kernel is not constant.
+        kernel_norm = 1 / (math.sqrt(2 * math.pi) * math.erf(num_sigma / math.sqrt(2)))
         
         
         # Perform a convolution of the cross section without smearing
         # with a Gaussian kernel.  Will use different algorithms
         # depending on how many precomputed points the integration
         # window contains.
-        if (end - start) / num_sigma > 20:
+        fine = (end - start) / num_sigma > 20
+        
+        for i in np.nonzero(fine)[0]:
             # Compute weights for the Gaussian kernel
-            weights = np.empty(end - start)
+            cur_mtt = self.xsec_nosmear_grid[0, start[i]:end[i]]
+            sigma = self.resolution * cur_mtt
+            weights = np.exp(-0.5 * ((mtt_values[i] - cur_mtt) / sigma) ** 2) * (kernel_norm / sigma)
             
-            for i in range(end - start):
-                cur_mtt = self.xsec_nosmear_grid[0, start + i]
-                sigma = self.resolution * cur_mtt
-                weights[i] = 1 / sigma * math.exp(-0.5 * ((mtt - cur_mtt) / sigma) ** 2)
-            
-            weights /= math.sqrt(2 * math.pi)
-            
-            # Correct for truncation in the kernel.  This is not exact
-            # because the variance of the kernel is not constant.
-            weights /= math.erf(num_sigma / math.sqrt(2))
-            
-            return simps(
-                self.xsec_nosmear_grid[1, start:end] * weights,
-                self.xsec_nosmear_grid[0, start:end], 'first'
+            xsec[i] = self._simpson(
+                self.xsec_nosmear_grid[1, start[i]:end[i]] * weights, cur_mtt
             )
         
-        else:
+        
+        coarse = np.logical_not(fine)
+        
+        if np.any(coarse):
             # The grid of precomputed points is too coarse for the
             # assumed resolution.  The cross section without smearing
             # can be approaximated using linear interpolation as it does
             # not change rapidly within the window, but more poitns are
             # needed for the convolution with the Gaussian kernel.
             
-            # Construct the interpolation object if not done yet
-            if self.xsec_nosmear_interp is None:
-                self.xsec_nosmear_interp = interp1d(
-                    self.xsec_nosmear_grid[0], self.xsec_nosmear_grid[1],
-                    copy=False, assume_sorted=True, bounds_error=False, fill_value=0.
-                )
-            
-            x = np.linspace(mtt - half_width, mtt + half_width, num=101)
-            y = np.empty_like(x)
-            
-            for i in range(len(x)):
-                sigma = self.resolution * x[i]
-                weight = 1 / sigma * math.exp(-0.5 * ((mtt - x[i]) / sigma) ** 2)
-                y[i] = self.xsec_nosmear_interp(x[i]) * weight
+            # Auxiliary uniform grids, one row per value of mtt
+            cur_mtt = mtt_values[coarse][:, np.newaxis]
+            cur_half_width = half_width[coarse][:, np.newaxis]
+            x = cur_mtt + cur_half_width * self._aux_offsets
             
-            y /= math.sqrt(2 * math.pi) * math.erf(num_sigma / math.sqrt(2))
+            sigma = self.resolution * x
+            xsec_nosmear = np.interp(
+                x, self.xsec_nosmear_grid[0], self.xsec_nosmear_grid[1], left=0., right=0.
+            )
+            y = xsec_nosmear * np.exp(-0.5 * ((cur_mtt - x) / sigma) ** 2) * (kernel_norm / sigma)
             
-            return simps(y, x)
+            # Integrate with Simpson's rule using precomputed weights
+            step = 2 * cur_half_width[:, 0] / (len(self._aux_offsets) - 1)
+            xsec[coarse] = (y @ self._aux_simpson_weights) * step
+        
+        
+        if np.ndim(mtt) == 0:
+            return xsec[0]
+        else:
+            return xsec
     
     
     def xsec_no_smear(self, mtt):
         """Compute differential cross section without smearing.
         
         Apply convolution with PDF and selection efficiencies, but not
-        the smearing.
+        the smearing.  Raise a ValueError if any mtt is outside of the
+        range covered by the PDF convolution table.
         
         Arguments:
-            mtt:  Parton-level mtt, in GeV.
+            mtt:  Parton-level mtt, in GeV, or a 1D array_like of such
+                values.
         
         Return value:
             Differential cross section in mtt, in pb / GeV, up to but
-            not including smearing.
+            not including smearing.  If an array of mtt values has been
+            given, this is an array of the same length.
         """
         
-        shat = mtt ** 2
-        alpha_s = self.pdf.alphasQ(self.scale(mtt))
+        mtt_values = np.atleast_1d(np.asarray(mtt, dtype=np.float64))
+        shat = mtt_values ** 2
+        
+        # The PDF convolution is only known within the range of the table,
+        # and np.interp would silently extrapolate with constants
+        if np.min(shat) < self.shat_pdf[0, 0] or np.max(shat) > self.shat_pdf[0, -1]:
+            raise ValueError(
+                'Parton-level s is outside of the range [{:g}, {:g}] GeV^2 '
+                'of the PDF convolution table.'.format(self.shat_pdf[0, 0], self.shat_pdf[0, -1])
+            )
+        
+        # LHAPDF only accepts scalars, so evaluate alpha_s point by point
+        alpha_s = np.array([self.pdf.alphasQ(q) for q in self.scale(mtt_values)])
         
         # Evaluate parts that are different for the two subprocesses
-        res = self.parton_xsec.xsec_res(mtt, alpha_s) * self.selection_efficiency(mtt, 'Res')
-        int_ = self.parton_xsec.xsec_int(mtt, alpha_s) * self.selection_efficiency(mtt, 'Int')
+        res = self.parton_xsec.xsec_res(mtt_values, alpha_s) * \
+            self.selection_efficiency(mtt_values, 'Res')
+        int_ = self.parton_xsec.xsec_int(mtt_values, alpha_s) * \
+            self.selection_efficiency(mtt_values, 'Int')
         
         # Convolute with PDF.  The last two terms appear from
         # translation of d[sigma] / d[sqrt(shat)] to d[sigma] / d[shat].
-        xsec = (res + int_) * self.shat_pdf_interp(shat) * 2 * mtt
+        xsec = (res + int_) * np.interp(shat, self.shat_pdf[0], self.shat_pdf[1]) * 2 * mtt_values
         
-        return xsec
+        if np.ndim(mtt) == 0:
+            return xsec[0]
+        else:
+            return xsec
+    
+    
+    @staticmethod
+    def _simpson(y, x):
+        """Integrate a sampled function with Simpson's rule.
+        
+        Reproduces scipy.integrate.simps with its default treatment of
+        an even number of points, which averages results obtained when
+        the trapezoidal rule is applied to the first or the last
+        interval.  Avoids the overhead of the generic implementation.
+        
+        Arguments:
+            y:  Values of the function.
+            x:  Sample points, in increasing order.
+        
+        Return value:
+            Estimate of the integral.
+        """
+        
+        h = np.diff(x)
+        
+        def simpson_pairs(start, stop):
+            # Apply Simpson's rule to consecutive pairs of intervals,
+            # starting from the given point
+            h0 = h[start:stop:2]
+            h1 = h[start + 1:stop + 1:2]
+            hsum = h0 + h1
+            h0divh1 = h0 / h1
+            
+            return np.sum(hsum / 6 * (
+                y[start:stop:2] * (2 - 1 / h0divh1) +
+                y[start + 1:stop + 1:2] * hsum * hsum / (h0 * h1) +
+                y[start + 2:stop + 2:2] * (2 - h0divh1)
+            ))
+        
+        n = len(y)
+        
+        if n % 2 == 1:
+            return simpson_pairs(0, n - 2)
+        else:
+            trapz_ends = 0.5 * h[-1] * (y[-1] + y[-2]) + 0.5 * h[0] * (y[1] + y[0])
+            return (simpson_pairs(0, n - 3) + simpson_pairs(1, n - 2)) / 2 + trapz_ends / 2
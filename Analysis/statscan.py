@@ -3,9 +3,10 @@ Exports classes to scan over parameters of a model.
 """
 
 import contextlib
+import itertools
+import multiprocessing
 import os
 import sys
-from uuid import uuid4
 
 import numpy as np
 from scipy.integrate import trapz
@@ -18,6 +19,8 @@ from matplotlib import pyplot as plt
 import ROOT
 from ROOT.RooStats import HistFactory
 
+from smoothTemplates import root_buffer_to_np
+
 
 mpl.rc('xtick', top=True, direction='in')
 mpl.rc('ytick', right=True, direction='in')
@@ -28,28 +31,62 @@ ROOT.Math.MinimizerOptions.SetDefaultMinimizer('Minuit2', 'Minimize')
 ROOT.RooStats.UseNLLOffset(True)
 
 
+# Counter to generate names of ROOT objects
+_name_counter = itertools.count()
+
+# File descriptor used by suppress_stdout
+_devnull_fd = os.open(os.devnull, os.O_WRONLY)
+
+
 @contextlib.contextmanager
 def suppress_stdout():
     """Context manager to suppress stdout.
     
-    Works for Python and external libraries alike.  Code from [1].
+    Works for Python and external libraries alike.  Based on [1], but
+    the file descriptor of stdout is redirected in place, without
+    replacing sys.stdout.
     [1] https://stackoverflow.com/a/17954769/966461
     """
     
     fd = sys.stdout.fileno()
+    sys.stdout.flush()
+    saved_fd = os.dup(fd)
+    
+    try:
+        os.dup2(_devnull_fd, fd)
+        yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved_fd, fd)
+        os.close(saved_fd)
+
+
+def _unique_name():
+    """Generate a name for a ROOT object that is unique in the process."""
+    
+    return 'statscan_{}'.format(next(_name_counter))
+
+
+def _init_scan_worker(evaluate):
+    """Store function to evaluate nodes in a worker process of a scan."""
     
-    def _redirect_stdout(to):
-        sys.stdout.close()
-        os.dup2(to.fileno(), fd)
-        sys.stdout = os.fdopen(fd, 'w')
+    global _scan_evaluate
+    _scan_evaluate = evaluate
+
+
+def _scan_node(node):
+    """Evaluate a node of a grid in a worker process of a scan.
     
-    with os.fdopen(os.dup(fd), 'w') as old_stdout:
-        with open(os.devnull, 'w') as f:
-            _redirect_stdout(to=f)
-        try:
-            yield
-        finally:
-            _redirect_stdout(to=old_stdout)
+    Arguments:
+        node:  Tuple with global index and x and y coordinates of the
+            node, as yielded by Grid.__iter__.
+    
+    Return value:
+        Tuple with the global index and the result of the evaluation.
+    """
+    
+    global_index, x, y = node
+    return global_index, _scan_evaluate(x, y)
 
 
 class Grid:
@@ -119,26 +156,65 @@ class Grid:
             None.
         """
         
-        np.savez(filename, x=self.x, y=self.y, significance=self.significance, cls=self.cls)
+        np.savez_compressed(
+            filename, x=self.x, y=self.y, significance=self.significance, cls=self.cls
+        )
+    
+    
+    def scan(self, evaluate, num_processes=1):
+        """Evaluate significance and CLs at every node of the grid.
+        
+        Nodes are independent and can be evaluated in parallel in
+        several processes.  They are created by forking the current
+        process, which means that evaluate does not need to be
+        picklable and can use objects created beforehand, such as an
+        instance of StatCalc.  Each process works with its own copies of
+        such objects.
+        
+        Arguments:
+            evaluate:  Callable that accepts x and y coordinates of a
+                node and returns a tuple with significance and CLs.
+            num_processes:  Number of processes to use.  If 1, nodes are
+                evaluated sequentially in the current process.
+        
+        Return value:
+            None.
+        """
+        
+        if num_processes == 1:
+            for global_index, x, y in self:
+                self.set(global_index, *evaluate(x, y))
+            
+            return
+        
+        context = multiprocessing.get_context('fork')
+        
+        with context.Pool(
+            num_processes, initializer=_init_scan_worker, initargs=(evaluate,)
+        ) as pool:
+            for global_index, result in pool.imap_unordered(_scan_node, self):
+                self.set(global_index, *result)
     
     
     def set(self, global_index, significance, cls):
-        """Set significance and CLs for a node.
+        """Set significance and CLs for a node or several nodes.
         
         The node is identified by a global index as returned by
         __iter__.
         
         Arguments:
-            global_index:  Global index identifying the node.
+            global_index:  Global index identifying the node.  Can also
+                be an array_like of indices to update several nodes at
+                once.
             significance, cls:  Values of significance and CLs to be
-                attached.
+                attached.  Must be array_like of the same length as
+                global_index if several nodes are updated.
         
         Return value:
             None.
         """
         
-        ix = global_index % len(self.x)
-        iy = global_index // len(self.x)
+        ix, iy = np.unravel_index(global_index, (len(self.x), len(self.y)), order='F')
         
         self.significance[ix, iy] = significance
         self.cls[ix, iy] = cls
@@ -174,16 +250,20 @@ class PlotScan:
         # Replace the results with placeholders in this case.  Also
         # clip valid but large values of significance, which is needed
         # to prevent instability in interpolation.
-        for val in np.nditer(self.significance, op_flags=['readwrite']):
-            if not np.isfinite(val) or val > self.max_significance:
-                val[...] = self.max_significance
-        
-        for val in np.nditer(self.cls, op_flags=['readwrite']):
-            if not np.isfinite(val) or val < 0.:
-                val[...] = 0.
+        with np.errstate(invalid='ignore'):
+            self.significance[np.logical_or(
+                np.logical_not(np.isfinite(self.significance)),
+                self.significance > self.max_significance
+            )] = self.max_significance
+            
+            self.cls[np.logical_or(np.logical_not(np.isfinite(self.cls)), self.cls < 0.)] = 0.
         
         self.fig = None
         self.axes = None
+        
+        # Spline interpolants for significance and CLs, indexed by
+        # their degree.  Filled by method _upsample.
+        self._splines = {}
     
     
     def draw(self):
@@ -209,11 +289,10 @@ class PlotScan:
         # Plot significance with a colour map.  Coordinates of grid
         # nodes are shifted since pcolormesh expects coordinates of bin
         # edges rather than centres.
-        xx_c, yy_c = np.meshgrid(self._centre_bins(x_up), self._centre_bins(y_up))
         colormap = plt.get_cmap('viridis')
         
         image = self.axes.pcolormesh(
-            xx_c, yy_c, significance_up.T,
+            self._centre_bins(x_up), self._centre_bins(y_up), significance_up.T,
             cmap=colormap, vmin=0., vmax=self.max_significance
         )
         self.fig.colorbar(
@@ -226,16 +305,15 @@ class PlotScan:
         # produce smooth contours.  Can afford a larger factor as it
         # does not increase the size of the output file much.
         x_up, y_up, significance_up, cls_up = self._upsample(10)
-        xx, yy = np.meshgrid(x_up, y_up)
         
         contours = self.axes.contour(
-            xx, yy, significance_up.T,
+            x_up, y_up, significance_up.T,
             [1., 3., 5.], colors='white', zorder=1.5
         )
         self.axes.clabel(contours, fmt='%g $\\sigma$')
         
         contour_cls = self.axes.contour(
-            xx, yy, cls_up.T,
+            x_up, y_up, cls_up.T,
             [0.05], colors='red', zorder=1.5
         )
         self.axes.clabel(contour_cls, fmt='95%% CL excl.')
@@ -270,6 +348,30 @@ class PlotScan:
         return anew
     
     
+    @staticmethod
+    def _split_bins(a, up_factor):
+        """Split each bin uniformly into given number of segments.
+        
+        Arguments:
+            a:  1D array_like with positions of nodes.
+            up_factor:  Number of segments into which each bin between
+                consecutive nodes is split.
+        
+        Return value:
+            Array with positions of nodes after the splitting.  Its
+            length is (len(a) - 1) * up_factor + 1.
+        """
+        
+        a = np.asarray(a)
+        step = np.diff(a) / up_factor
+        
+        up = np.empty((len(a) - 1) * up_factor + 1)
+        up[:-1] = (np.arange(up_factor) * step[:, np.newaxis] + a[:-1, np.newaxis]).ravel()
+        up[-1] = a[-1]
+        
+        return up
+    
+    
     def _upsample(self, up_factor=10, degree=3):
         """Up-sample the grid.
         
@@ -285,30 +387,24 @@ class PlotScan:
         """
         
         # Uniformally split each bin in the grid into up_factor segments
-        x_up = np.empty((len(self.x) - 1) * up_factor + 1)
-        y_up = np.empty((len(self.y) - 1) * up_factor + 1)
-        
-        for src, up in [(self.x, x_up), (self.y, y_up)]:
-            for i in range(len(src) - 1):
-                up[i * up_factor : (i + 1) * up_factor] = np.linspace(
-                    src[i], src[i + 1], num=up_factor, endpoint=False
-                )
-            
-            up[-1] = src[-1]
+        x_up = self._split_bins(self.x, up_factor)
+        y_up = self._split_bins(self.y, up_factor)
         
         
         # Up-sample significance and CLs values using spline
-        # interpolation
-        significance_interp = RectBivariateSpline(
-            self.x, self.y, self.significance,
-            kx=min(degree, len(self.x) - 1), ky=min(degree, len(self.y) - 1)
-        )
-        significance_up = significance_interp(x_up, y_up)
+        # interpolation.  The splines only depend on the degree and are
+        # reused for all up-sampling factors.
+        if degree not in self._splines:
+            self._splines[degree] = tuple(
+                RectBivariateSpline(
+                    self.x, self.y, values,
+                    kx=min(degree, len(self.x) - 1), ky=min(degree, len(self.y) - 1)
+                )
+                for values in [self.significance, self.cls]
+            )
         
-        cls_interp = RectBivariateSpline(
-            self.x, self.y, self.cls,
-            kx=min(degree, len(self.x) - 1), ky=min(degree, len(self.y) - 1)
-        )
+        significance_interp, cls_interp = self._splines[degree]
+        significance_up = significance_interp(x_up, y_up)
         cls_up = cls_interp(x_up, y_up)
         
         return (x_up, y_up, significance_up, cls_up)
@@ -350,11 +446,18 @@ class StatCalc:
         
         bkgfile = ROOT.TFile(bkgfile)
         
-        # Read binning from the file with backgrounds
-        hist = bkgfile.Get('TT')
-        self.binning = np.asarray([
-            hist.GetBinLowEdge(bin) for bin in range(1, hist.GetNbinsX() + 2)
-        ])
+        # Read binning from the file with backgrounds.  Edges of a
+        # variable binning are copied from the underlying array of the
+        # axis, while a uniform binning is reconstructed in the same way
+        # as in TAxis::GetBinLowEdge.
+        axis = bkgfile.Get('TT').GetXaxis()
+        num_bins = axis.GetNbins()
+        
+        if axis.GetXbins().GetSize() > 0:
+            self.binning = root_buffer_to_np(axis.GetXbins().GetArray(), num_bins + 1)
+        else:
+            bin_width = (axis.GetXmax() - axis.GetXmin()) / num_bins
+            self.binning = axis.GetXmin() + np.arange(num_bins + 1) * bin_width
         
         
         # Read all background templates converting them to trivial
@@ -486,27 +589,27 @@ class StatCalc:
         channel = HistFactory.Channel('Channel')
         
         sgn_pos = HistFactory.Sample('SgnPos')
-        sgn_pos.SetHisto(self._signal_templates['SgnPos'].Clone(uuid4().hex))
+        sgn_pos.SetHisto(self._signal_templates['SgnPos'].Clone(_unique_name()))
         sgn_pos.AddNormFactor('r', 1., 0., 10., True)
         sgn_pos.SetNormalizeByTheory(True)
         
         syst = HistFactory.HistoSys('RenormScale')
-        syst.SetHistoHigh(self._signal_templates['SgnPos_RenormScaleUp'].Clone(uuid4().hex))
-        syst.SetHistoLow(self._signal_templates['SgnPos_RenormScaleDown'].Clone(uuid4().hex))
+        syst.SetHistoHigh(self._signal_templates['SgnPos_RenormScaleUp'].Clone(_unique_name()))
+        syst.SetHistoLow(self._signal_templates['SgnPos_RenormScaleDown'].Clone(_unique_name()))
         sgn_pos.AddHistoSys(syst)
         
         sgn_neg = HistFactory.Sample('SgnNeg')
-        sgn_neg.SetHisto(self._signal_templates['SgnNeg'].Clone(uuid4().hex))
+        sgn_neg.SetHisto(self._signal_templates['SgnNeg'].Clone(_unique_name()))
         sgn_neg.AddNormFactor('negR', -1., -10., 0., True)
         sgn_neg.SetNormalizeByTheory(True)
         
         syst = HistFactory.HistoSys('RenormScale')
-        syst.SetHistoHigh(self._signal_templates['SgnNeg_RenormScaleUp'].Clone(uuid4().hex))
-        syst.SetHistoLow(self._signal_templates['SgnNeg_RenormScaleDown'].Clone(uuid4().hex))
+        syst.SetHistoHigh(self._signal_templates['SgnNeg_RenormScaleUp'].Clone(_unique_name()))
+        syst.SetHistoLow(self._signal_templates['SgnNeg_RenormScaleDown'].Clone(_unique_name()))
         sgn_neg.AddHistoSys(syst)
         
         bkg = HistFactory.Sample('TT')
-        bkg.SetHisto(self._bkg_templates['TT'].Clone(uuid4().hex))
+        bkg.SetHisto(self._bkg_templates['TT'].Clone(_unique_name()))
         bkg.AddOverallSys('TTRate', 0.9, 1.1)
         
         systNames = ['MttScale', 'RenormScale', 'FactorScale', 'FSR', 'MassT', 'PDFAlphaS']
@@ -514,8 +617,8 @@ class StatCalc:
         
         for systName in systNames:
             syst = HistFactory.HistoSys(systName)
-            syst.SetHistoHigh(self._bkg_templates['TT_{}Up'.format(systName)].Clone(uuid4().hex))
-            syst.SetHistoLow(self._bkg_templates['TT_{}Down'.format(systName)].Clone(uuid4().hex))
+            syst.SetHistoHigh(self._bkg_templates['TT_{}Up'.format(systName)].Clone(_unique_name()))
+            syst.SetHistoLow(self._bkg_templates['TT_{}Down'.format(systName)].Clone(_unique_name()))
             bkg.AddHistoSys(syst)
         
         
@@ -574,19 +677,14 @@ class StatCalc:
             
             
             # In each bin given by the binning, integrate the
-            # differential cross section
-            xsec_integral = np.empty(len(self.binning) - 1)
+            # differential cross section.  Sample points for all bins
+            # are arranged in an array of shape (num_bins, num_samples)
+            # and the cross section is evaluated for all of them at
+            # once.
             num_samples = 10
-            
-            for ibin in range(len(xsec_integral)):
-                
-                x = np.linspace(self.binning[ibin], self.binning[ibin + 1], num=num_samples)
-                y = np.empty_like(x)
-                
-                for isample in range(num_samples):
-                    y[isample] = self.signal_distr_calc.xsec(x[isample])
-                
-                xsec_integral[ibin] = trapz(y, x)
+            x = self._sample_bins(self.binning, num_samples)
+            y = self.signal_distr_calc.xsec(x.ravel()).reshape(x.shape)
+            xsec_integral = trapz(y, x, axis=1)
             
             
             # Put results into histograms, separately for positive and
@@ -615,6 +713,28 @@ class StatCalc:
                 self._signal_templates[hist.GetName()] = hist
     
     
+    @staticmethod
+    def _sample_bins(binning, num_samples):
+        """Construct uniform samples of points in each bin.
+        
+        Arguments:
+            binning:  Edges of bins.
+            num_samples:  Number of points in each bin, including its
+                edges.
+        
+        Return value:
+            NumPy array of shape (len(binning) - 1, num_samples).  Its
+            rows are the same as would be produced by np.linspace
+            applied to each bin.
+        """
+        
+        step = np.diff(binning) / (num_samples - 1)
+        x = np.arange(num_samples) * step[:, np.newaxis] + binning[:-1, np.newaxis]
+        x[:, -1] = binning[1:]
+        
+        return x
+    
+    
     @staticmethod
     def _strip_binning(hist):
         """Copy ROOT histogram stripping binning information.
@@ -630,17 +750,30 @@ class StatCalc:
             Newly created ROOT histogram with trivial equidistant
             binning.
         
-        Ignore under- and overflow bins.
+        Ignore under- and overflow bins.  The source histogram must
+        have double-precision bin contents, e.g. be a TH1D.
         """
         
         num_bins = hist.GetNbinsX()
         
-        newhist = ROOT.TH1D(uuid4().hex, '', num_bins, 0., num_bins)
+        newhist = ROOT.TH1D(_unique_name(), '', num_bins, 0., num_bins)
         newhist.SetDirectory(None)
         newhist.SetName(hist.GetName())
         
-        for bin in range(1, num_bins + 1):
-            newhist.SetBinContent(bin, hist.GetBinContent(bin))
-            newhist.SetBinError(bin, hist.GetBinError(bin))
+        # Copy bin contents from the underlying array of the source
+        # histogram
+        contents = root_buffer_to_np(hist.GetArray(), num_bins + 2)
+        contents[0] = contents[-1] = 0.
+        newhist.SetContent(contents)
+        
+        # If the source histogram has no sums of squared weights, its
+        # errors are given by square roots of bin contents.  The new
+        # histogram then reproduces them without an array of its own.
+        # Otherwise copy the sums of squared weights directly.
+        if hist.GetSumw2N() > 0:
+            sumw2 = root_buffer_to_np(hist.GetSumw2().GetArray(), num_bins + 2)
+            sumw2[0] = sumw2[-1] = 0.
+            newhist.Sumw2()
+            newhist.GetSumw2().Set(num_bins + 2, sumw2)
         
         return newhist
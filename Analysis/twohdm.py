@@ -1,5 +1,7 @@
 import math
 
+import numpy as np
+
 from spectrum import PartonXSec
 
 
@@ -50,47 +52,107 @@ class XSecTwoHDM(PartonXSec):
         """Compute cross section for resonant part in gg -> S -> tt.
         
         Arguments:
-            sqrt_s:  Square root of Mandelstam s variable, in GeV.
-            alpha_s:  Value of the strong coupling constant.
+            sqrt_s:  Square root of Mandelstam s variable, in GeV, or a
+                NumPy array of such values.
+            alpha_s:  Value of the strong coupling constant, or an array
+                of such values of the same shape as sqrt_s.
         
         Return value:
-            Computed cross section, in pb.
+            Computed cross section, in pb.  It is an array if sqrt_s is
+            an array.
         
         Implements abstract method of the superclass.
         """
         
-        return self.xsec_even_res(sqrt_s, alpha_s) + self.xsec_odd_res(sqrt_s, alpha_s)
+        kinematics = self._kinematics(sqrt_s)
+        xsec = self._xsec_even_res(alpha_s, *kinematics) + \
+            self._xsec_odd_res(alpha_s, *kinematics)
+        
+        return self._threshold_cut(kinematics[0], xsec)
     
     
     def xsec_int(self, sqrt_s, alpha_s):
         """Compute cross section for interference in gg -> S -> tt.
         
         Arguments:
-            sqrt_s:  Square root of Mandelstam s variable, in GeV.
-            alpha_s:  Value of the strong coupling constant.
+            sqrt_s:  Square root of Mandelstam s variable, in GeV, or a
+                NumPy array of such values.
+            alpha_s:  Value of the strong coupling constant, or an array
+                of such values of the same shape as sqrt_s.
         
         Return value:
-            Computed cross section, in pb.
+            Computed cross section, in pb.  It is an array if sqrt_s is
+            an array.
         
         Implements abstract method of the superclass.
         """
         
-        return self.xsec_even_int(sqrt_s, alpha_s) + self.xsec_odd_int(sqrt_s, alpha_s)
+        kinematics = self._kinematics(sqrt_s)
+        xsec = self._xsec_even_int(alpha_s, *kinematics) + \
+            self._xsec_odd_int(alpha_s, *kinematics)
+        
+        return self._threshold_cut(kinematics[0], xsec)
     
     
     def xsec_even_res(self, sqrt_s, alpha_s):
         """Compute cross section for resonant gg -> H -> tt."""
         
-        if self.gH == 0.:
-            return 0.
+        kinematics = self._kinematics(sqrt_s)
+        return self._threshold_cut(kinematics[0], self._xsec_even_res(alpha_s, *kinematics))
+    
+    
+    def xsec_even_int(self, sqrt_s, alpha_s):
+        """Compute cross section for interference in gg -> H -> tt."""
+        
+        kinematics = self._kinematics(sqrt_s)
+        return self._threshold_cut(kinematics[0], self._xsec_even_int(alpha_s, *kinematics))
+    
+    
+    def xsec_odd_res(self, sqrt_s, alpha_s):
+        """Compute cross section for resonant gg -> A -> tt."""
+        
+        kinematics = self._kinematics(sqrt_s)
+        return self._threshold_cut(kinematics[0], self._xsec_odd_res(alpha_s, *kinematics))
+    
+    
+    def xsec_odd_int(self, sqrt_s, alpha_s):
+        """Compute cross section for interference in gg -> A -> tt."""
+        
+        kinematics = self._kinematics(sqrt_s)
+        return self._threshold_cut(kinematics[0], self._xsec_odd_int(alpha_s, *kinematics))
+    
+    
+    def _kinematics(self, sqrt_s):
+        """Compute kinematic variables shared by all contributions.
+        
+        Arguments:
+            sqrt_s:  Square root of Mandelstam s variable, in GeV, or a
+                NumPy array of such values.
+        
+        Return value:
+            Tuple (s, beta, y), where beta is the velocity of top quarks
+            and y = log((1 + beta) / (1 - beta)).  Below the tt
+            threshold beta and y are NaN.
+        """
         
         s = sqrt_s ** 2
         
-        if s <= 4 * self.mt ** 2:
-            return 0.
+        with np.errstate(invalid='ignore'):
+            beta = self.beta(s)
+            y = 2 * np.arctanh(beta)
+        
+        return s, beta, y
+    
+    
+    def _xsec_even_res(self, alpha_s, s, beta, y):
+        """Compute cross section for resonant gg -> H -> tt.
         
-        beta = self.beta(s)
-        y = math.log((1 + beta) / (1 - beta))
+        Use kinematic variables computed with method _kinematics.
+        Threshold is not applied.
+        """
+        
+        if self.gH == 0.:
+            return 0.
         
         a = 3 * (alpha_s * self.gF * self.mt ** 3) ** 2 * beta ** 3 / (1024 * math.pi ** 3)
         b = 16 + 8 * beta ** 2 * (math.pi ** 2 - y ** 2) + beta ** 4 * (math.pi ** 2 + y ** 2) ** 2
@@ -99,20 +161,16 @@ class XSecTwoHDM(PartonXSec):
         return self.to_pb(self.kH_res * self.gH ** 4 * a * b / denom)
     
     
-    def xsec_even_int(self, sqrt_s, alpha_s):
-        """Compute cross section for interference in gg -> H -> tt."""
-        
-        if self.gH == 0.:
-            return 0.
+    def _xsec_even_int(self, alpha_s, s, beta, y):
+        """Compute cross section for interference in gg -> H -> tt.
         
-        s = sqrt_s ** 2
+        Use kinematic variables computed with method _kinematics.
+        Threshold is not applied.
+        """
         
-        if s <= 4 * self.mt ** 2:
+        if self.gH == 0.:
             return 0.
         
-        beta = self.beta(s)
-        y = math.log((1 + beta) / (1 - beta))
-        
         a = -alpha_s ** 2 * self.gF * self.mt ** 4 * beta ** 2 / \
             (32 * math.pi * math.sqrt(2) * s) * y
         b = (s - self.mH ** 2) * (4 + beta ** 2 * (math.pi ** 2 - y ** 2)) + \
@@ -122,20 +180,16 @@ class XSecTwoHDM(PartonXSec):
         return self.to_pb(self.kH_int * self.gH ** 2 * a * b / denom)
     
     
-    def xsec_odd_res(self, sqrt_s, alpha_s):
-        """Compute cross section for resonant gg -> A -> tt."""
+    def _xsec_odd_res(self, alpha_s, s, beta, y):
+        """Compute cross section for resonant gg -> A -> tt.
         
-        if self.gA == 0.:
-            return 0.
-        
-        s = sqrt_s ** 2
+        Use kinematic variables computed with method _kinematics.
+        Threshold is not applied.
+        """
         
-        if s <= 4 * self.mt ** 2:
+        if self.gA == 0.:
             return 0.
         
-        beta = self.beta(s)
-        y = math.log((1 + beta) / (1 - beta))
-        
         a = 3 * (alpha_s * self.gF * self.mt ** 3) ** 2 * beta / (1024 * math.pi ** 3)
         b = (math.pi ** 2 + y ** 2) ** 2
         denom = (s - self.mA ** 2) ** 2 + (self.mA * self.wA) ** 2
@@ -143,20 +197,16 @@ class XSecTwoHDM(PartonXSec):
         return self.to_pb(self.kA_res * self.gA ** 4 * a * b / denom)
     
     
-    def xsec_odd_int(self, sqrt_s, alpha_s):
-        """Compute cross section for interference in gg -> A -> tt."""
+    def _xsec_odd_int(self, alpha_s, s, beta, y):
+        """Compute cross section for interference in gg -> A -> tt.
         
-        if self.gA == 0.:
-            return 0.
-        
-        s = sqrt_s ** 2
+        Use kinematic variables computed with method _kinematics.
+        Threshold is not applied.
+        """
         
-        if s <= 4 * self.mt ** 2:
+        if self.gA == 0.:
             return 0.
         
-        beta = self.beta(s)
-        y = math.log((1 + beta) / (1 - beta))
-        
         a = -alpha_s ** 2 * self.gF * self.mt ** 4 / (32 * math.pi * math.sqrt(2) * s) * y
         b = (s - self.mA ** 2) * (math.pi ** 2 - y ** 2) + 2 * math.pi * self.mA * self.wA * y
         denom = (s - self.mA ** 2) ** 2 + (self.mA * self.wA) ** 2
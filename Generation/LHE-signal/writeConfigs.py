@@ -37,10 +37,7 @@ if __name__ == '__main__':
         raise RuntimeError('Unsupported CP state "{}".'.format(args.state))
     
     if args.output:
-        try:
-            os.makedirs(args.output)
-        except FileExistsError:
-            pass
+        os.makedirs(args.output, exist_ok=True)
     
     
     if args.state == 'A':
@@ -53,36 +50,39 @@ if __name__ == '__main__':
         param_pdgid = 6000045
     
     
+    # The body of the script only depends on the mass and width, which
+    # are substituted for each mass point
+    indent = ' ' * 2
+    body_template = ''.join('{}{}\n'.format(indent, line) for line in [
+        '',
+        'done',
+        '',
+        'set run_card nevents {}'.format(args.split),
+        'set run_card pdlabel lhapdf',
+        'set run_card lhaid 90400',
+        'set run_card sys_pdf PDF4LHC15_nlo_30_pdfas',
+        'set run_card dynamical_scale_choice 0',
+        '',
+        'set run_card xptl 30',
+        '',
+        'set param_card {}  {{mass}}'.format(param_mass),
+        'set param_card {}  {{width}}'.format(param_width),
+        'set param_card DECAY {}  {{width}}'.format(param_pdgid),
+        '',
+        'done',
+    ]) + '\n'
+    n_clones = int(round(args.n / args.split))
+    launch_prefix = 'launch {} -n '.format(args.directory)
+    output_prefix = os.path.join(args.output, '')
+    
     for mass in [400, 500, 600, 700, 1000]:
-        width = mass * ars.width
-            
-        for iclone in range(int(round(args.n / args.split))):
-            
-            job_name = 'm{:g}_w{:g}_{}'.format(mass, width, iclone + 1)
-            outfile = open(os.path.join(args.output, job_name + '.script'), 'w')
-            
-            outfile.write('launch {} -n {}\n'.format(args.directory, job_name))
-            indent = ' ' * 2
+        width = mass * args.width
+        body = body_template.format(mass=mass, width=width)
+        job_prefix = 'm{:g}_w{:g}_'.format(mass, width)
+        
+        for iclone in range(n_clones):
             
-            for line in [
-                '',
-                'done',
-                '',
-                'set run_card nevents {}'.format(args.split),
-                'set run_card pdlabel lhapdf',
-                'set run_card lhaid 90400',
-                'set run_card sys_pdf PDF4LHC15_nlo_30_pdfas',
-                'set run_card dynamical_scale_choice 0',
-                '',
-                'set run_card xptl 30',
-                '',
-                'set param_card {}  {}'.format(param_mass, mass),
-                'set param_card {}  {}'.format(param_width, width),
-                'set param_card DECAY {}  {}'.format(param_pdgid, width),
-                '',
-                'done',
-            ]:
-                outfile.write('{}{}\n'.format(indent, line))
+            job_name = job_prefix + str(iclone + 1)
             
-            outfile.write('\n')
-            outfile.close()
+            with open(output_prefix + job_name + '.script', 'w') as outfile:
+                outfile.write(launch_prefix + job_name + '\n' + body)
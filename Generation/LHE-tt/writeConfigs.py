@@ -35,39 +35,35 @@ if __name__ == '__main__':
     output_dir = os.path.dirname(args.output)
     
     if output_dir:
-        try:
-            os.makedirs(output_dir)
-        except FileExistsError:
-            pass
+        os.makedirs(output_dir, exist_ok=True)
     
     
+    indent = ' ' * 2
+    body = ''.join('{}{}\n'.format(indent, line) for line in [
+        '',
+        'done',
+        '',
+        'set run_card nevents {}'.format(args.split),
+        'set run_card pdlabel lhapdf',
+        'set run_card lhaid 90400',
+        'set run_card sys_pdf PDF4LHC15_nlo_30_pdfas',
+        'set run_card dynamical_scale_choice 0',
+        '',
+        'set run_card xptl 30',
+        '',
+        'set param_card mt  {}'.format(args.mt),
+        'set param_card ymt {}'.format(args.mt),
+        '',
+        '',
+        'done',
+    ]) + '\n'
+    
+    launch_prefix = 'launch {} -n '.format(args.directory)
+    job_prefix = os.path.basename(args.output) + '_'
+    
     for iclone in range(int(round(args.n / args.split))):
         
-        job_name = os.path.basename('{}_{}'.format(args.output, iclone + 1))
-        outfile = open('{}_{}.script'.format(args.output, iclone + 1), 'w')
-        
-        outfile.write('launch {} -n {}\n'.format(args.directory, job_name))
-        indent = ' ' * 2
-        
-        for line in [
-            '',
-            'done',
-            '',
-            'set run_card nevents {}'.format(args.split),
-            'set run_card pdlabel lhapdf',
-            'set run_card lhaid 90400',
-            'set run_card sys_pdf PDF4LHC15_nlo_30_pdfas',
-            'set run_card dynamical_scale_choice 0',
-            '',
-            'set run_card xptl 30',
-            '',
-            'set param_card mt  {}'.format(args.mt),
-            'set param_card ymt {}'.format(args.mt),
-            '',
-            '',
-            'done',
-        ]:
-            outfile.write('{}{}\n'.format(indent, line))
+        clone_suffix = str(iclone + 1)
         
-        outfile.write('\n')
-        outfile.close()
+        with open(args.output + '_' + clone_suffix + '.script', 'w') as outfile:
+            outfile.write(launch_prefix + job_prefix + clone_suffix + '\n' + body)
@@ -14,125 +14,136 @@ subdirectory "logs" in the output directory.
 """
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import functools
+import gzip
 import os
-import queue
 import re
+import shutil
 import subprocess
 import sys
+import tempfile
 import threading
-from uuid import uuid4
+import zlib
 
 
 # Global lock for printing
 printLock = threading.Lock()
 
 
-def worker(inputs, delphesConfigFile, pythiaConfigTemplate, prefix, outDir, logDir, tmpDir):
+def process_one(lheFile, delphesConfigFile, pythiaConfigTemplate, prefix, outDir, logDir, tmpDir):
+    """Run Pythia and Delphes on a single LHE file and report success."""
     
-    while True:
-        try:
-            lheFile = inputs.get_nowait()
-        except queue.Empty:
-            break
-        
-        
-        # Construct base name for the output file and log file
-        name = prefix + os.path.basename(os.path.dirname(lheFile))
-        outFilePath = os.path.join(outDir, name + '.root')
-        
-        
-        # Create log file
-        logFile = open(os.path.join(logDir, name + '.log'), 'w')
-        logFile.write('Job to produce file "{}" started at {}.\n\n'.format(
-            outFilePath, datetime.now()
-        ))
-        
-        
-        # Make sure the input file actually exists
-        if not os.path.exists(lheFile) or not os.path.isfile(lheFile):
-            logFile.write('File "{}" does not exist. Job aborted.\n'.format(lheFile))
-            logFile.close()
-            
-            with printLock:
-                print('File "{}" does not exist.'.format(lheFile), file=sys.stderr)
-            
-            inputs.task_done()
-            return
-            
-        
+    # Construct base name for the output file and log file
+    name = prefix + os.path.basename(os.path.dirname(lheFile))
+    outFilePath = os.path.join(outDir, name + '.root')
+    
+    
+    # Create log file.  It is line-buffered since Delphes writes directly
+    # to its descriptor, and messages from this script must not lag behind.
+    logFile = open(os.path.join(logDir, name + '.log'), 'w', buffering=1)
+    logFile.write('Job to produce file "{}" started at {}.\n\n'.format(
+        outFilePath, datetime.now()
+    ))
+    
+    
+    # Make sure the input file actually exists
+    if not os.path.isfile(lheFile):
+        logFile.write('File "{}" does not exist. Job aborted.\n'.format(lheFile))
+        logFile.close()
         
-        tmpFileNames = []
+        with printLock:
+            print('File "{}" does not exist.'.format(lheFile), file=sys.stderr)
         
-        # Uncompress the LHE file into a temporary copy
-        unzippedLHEName = os.path.join(tmpDir, 'events_{}.lhe'.format(name))
-        unzippedLHE = open(unzippedLHEName, 'w')
-        subprocess.check_call(
-            ['gzip', '-cd', lheFile], stdout=unzippedLHE
-        )
-        unzippedLHE.close()
+        return False
+    
+    
+    # Create a directory for temporary files of this job
+    jobTmpDir = tempfile.mkdtemp(prefix=name + '_', dir=tmpDir)
+    
+    # Uncompress the LHE file into a temporary copy.  It must be a regular
+    # file rather than a pipe because DelphesPythia8 reads it twice:  once
+    # in Pythia and once in its own LHEF reader, which fills LHE-level
+    # particles in the output.  Then create a temporary file with Pythia
+    # configuration.  A corrupted input file or a full disk only aborts
+    # this job.
+    unzippedLHEName = os.path.join(jobTmpDir, 'events.lhe')
+    pythiaConfigFileName = os.path.join(jobTmpDir, 'pythiaConfig.cmnd')
+    
+    try:
+        with gzip.open(lheFile, 'rb') as src, open(unzippedLHEName, 'wb') as dst:
+            shutil.copyfileobj(src, dst, length=1 << 20)
         
         logFile.write(
             'Input LHE file "{}" unzipped to file "{}".\n\n'.format(
                 lheFile, unzippedLHEName
             )
         )
-        tmpFileNames.append(unzippedLHEName)
-        
-        
-        # Create a temporary file with Pythia configuration
-        pythiaConfigFileName = os.path.join(tmpDir, 'pythiaConfig_{}.cmnd'.format(name))
-        pythiaConfigFile = open(pythiaConfigFileName, 'w')
-        pythiaConfigFile.write(pythiaConfigTemplate)
-        pythiaConfigFile.write('Beams:LHEF = {}\n'.format(unzippedLHEName))
-        pythiaConfigFile.close()
-        
-        logFile.write('Temporary configuration file "{}" created.\n\n'.format(
-            pythiaConfigFileName
-        ))
-        tmpFileNames.append(pythiaConfigFileName)
-        
         
-        logFile.flush()
-        
-        # Run Delphes
-        logFile.write('Starting Delphes.\n')
-        
-        command = ['DelphesPythia8', delphesConfigFile, pythiaConfigFileName, outFilePath]
-        
-        try:
-            subprocess.check_call(command, stdout=logFile, stderr=subprocess.STDOUT)
-        
-        except subprocess.CalledProcessError as error:
-            logFile.write('Command "{}" terminated with error code {}. Job aborted.\n'.format(
-                ' '.join(command), error.returncode
-            ))
-            logFile.close()
-            
-            with printLock:
-                print(
-                    'Delphes terminated with an error when processing file "{}".'.format(lheFile),
-                    file=sys.stderr
-                )
-            
-            inputs.task_done()
-            return
+        with open(pythiaConfigFileName, 'w') as pythiaConfigFile:
+            pythiaConfigFile.write(
+                pythiaConfigTemplate + 'Beams:LHEF = {}\n'.format(unzippedLHEName)
+            )
+    
+    except (OSError, EOFError, zlib.error) as error:
+        shutil.rmtree(jobTmpDir, ignore_errors=True)
         
-        logFile.write('\nDelphes run is complete.\n\n')
+        logFile.write('Failed to prepare input for Delphes: {}. Job aborted.\n'.format(error))
+        logFile.close()
         
+        with printLock:
+            print(
+                'Failed to prepare input for Delphes from file "{}": {}.'.format(lheFile, error),
+                file=sys.stderr
+            )
         
-        # Clean up temporary files
-        for f in tmpFileNames:
-            os.remove(f)
-            logFile.write('Temporary file "{}" deleted.\n'.format(f))
+        return False
+    
+    logFile.write('Temporary configuration file "{}" created.\n\n'.format(
+        pythiaConfigFileName
+    ))
+    
+    
+    # Run Delphes
+    logFile.write('Starting Delphes.\n')
+    
+    command = ['DelphesPythia8', delphesConfigFile, pythiaConfigFileName, outFilePath]
+    
+    try:
+        subprocess.check_call(command, stdout=logFile, stderr=subprocess.STDOUT)
+    
+    except subprocess.CalledProcessError as error:
+        shutil.rmtree(jobTmpDir, ignore_errors=True)
         
+        logFile.write('Command "{}" terminated with error code {}. Job aborted.\n'.format(
+            ' '.join(command), error.returncode
+        ))
+        logFile.close()
         
         with printLock:
-            print('Finished processing file "{}".'.format(lheFile))
+            print(
+                'Delphes terminated with an error when processing file "{}".'.format(lheFile),
+                file=sys.stderr
+            )
         
-        logFile.write('\nEverything done.\n')
-        logFile.close()
-        inputs.task_done()
+        return False
+    
+    logFile.write('\nDelphes run is complete.\n\n')
+    
+    
+    # Clean up temporary files
+    shutil.rmtree(jobTmpDir)
+    logFile.write('Temporary directory "{}" deleted.\n'.format(jobTmpDir))
+    
+    
+    with printLock:
+        print('Finished processing file "{}".'.format(lheFile))
+    
+    logFile.write('\nEverything done.\n')
+    logFile.close()
+    
+    return True
 
 
 if __name__ == '__main__':
@@ -162,70 +173,62 @@ if __name__ == '__main__':
         '--delphes-config', dest='delphesConfig', default='delphes_card.tcl',
         help='TCL configuration file for Delphes'
     )
+    argParser.add_argument(
+        '--tmp-dir', dest='tmpDir', default=None,
+        help='Directory in which to place temporary files.  Each running job keeps '
+        'there an uncompressed copy of its input LHE file, which can take several GB.  '
+        'Defaults to the system temporary directory ($TMPDIR or /tmp), which is '
+        'often a small tmpfs.'
+    )
     args = argParser.parse_args()
     
-    if not os.path.exists(args.output):
-        os.makedirs(args.output)
-    
     logDir = os.path.join(args.output, 'logs')
-    
-    if not os.path.exists(logDir):
-        os.makedirs(logDir)
+    os.makedirs(logDir, exist_ok=True)
     
     for path in [args.pythiaConfig, args.delphesConfig]:
-        if not os.path.exists(path) or not os.path.isfile(path):
+        if not os.path.isfile(path):
             raise RuntimeError('File "{}" does not exist.'.format(path))
     
     
     startTime = datetime.now()
     
-    inputs = queue.Queue()
-    
-    for d in args.inputDirs:
-        inputs.put(os.path.join(d, 'unweighted_events.lhe.gz'))
+    lheFiles = [os.path.join(d, 'unweighted_events.lhe.gz') for d in args.inputDirs]
     
     
     # Create a Pythia configuration but without the name of the input
     # LHE file, which will be added in each job
     with open(args.pythiaConfig) as f:
-        pythiaConfigTemplate = f.readlines()
-    
-    for i in range(len(pythiaConfigTemplate)):
-        if 'Beams:LHEF' in pythiaConfigTemplate[i]:
-            del pythiaConfigTemplate[i]
-            break
+        pythiaConfigTemplate = ''.join(line for line in f if 'Beams:LHEF' not in line)
     
-    pythiaConfigTemplate = ''.join(pythiaConfigTemplate)
     
+    # Create a directory to store temporary files.  Unless requested
+    # otherwise, it is placed in the system temporary directory rather than
+    # the current one, which might be on a network file system.
+    tmpDir = tempfile.mkdtemp(prefix='runDelphes_', dir=args.tmpDir)
     
-    # Create a directory to store temporary files
-    tmpDir = uuid4().hex
-    os.makedirs(tmpDir)
     
+    # Run generation using a thread pool.  The temporary directory is
+    # removed even if the run is interrupted or a job raises an exception.
+    job = functools.partial(
+        process_one, delphesConfigFile=args.delphesConfig,
+        pythiaConfigTemplate=pythiaConfigTemplate, prefix=args.prefix,
+        outDir=args.output, logDir=logDir, tmpDir=tmpDir
+    )
     
-    # Run generation using a thread pool
-    threads = []
-    
-    for i in range(min(args.numParallel, inputs.qsize())):
-        t = threading.Thread(target=worker, args=(
-            inputs, args.delphesConfig, pythiaConfigTemplate,
-            args.prefix, args.output, logDir, tmpDir
-        ))
-        threads.append(t)
-        t.start()
-    
-    for t in threads:
-        t.join()
+    try:
+        with ThreadPoolExecutor(max_workers=args.numParallel) as executor:
+            results = list(executor.map(job, lheFiles))
+    finally:
+        shutil.rmtree(tmpDir, ignore_errors=True)
     
     
     elapsedTime = datetime.now() - startTime
+    numFailed = results.count(False)
     
-    try:
-        os.rmdir(tmpDir)
+    if numFailed == 0:
         print('Done. Total elapsed time: {}.'.format(elapsedTime))
-    except OSError:
-        print(
-            'Processing done but temporary directory "{}" is not emptry. '
-            'Some jobs must have failed.'.format(tmpDir)
-        )
+    else:
+        print('Processing done but {} out of {} jobs failed.'.format(
+            numFailed, len(results)
+        ))
         print('Total elapsed time: {}.'.format(elapsedTime))